@@ -2,14 +2,16 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import os
+import re
 import logging
 import signal
 import socket
 import uuid
 import subprocess
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import asyncio
 
@@ -55,10 +57,10 @@ if not hasattr(asyncio, "set_child_watcher"):
 
     asyncio.set_child_watcher = _noop_set_child_watcher  # type: ignore[attr-defined]
 
-from pyhap.accessory import Accessory
-from pyhap.accessory_driver import AccessoryDriver
-from pyhap.const import CATEGORY_TELEVISION
-import vdf
+# pyhap and vdf are imported where they're used, so `--help` and argument
+# errors don't pay for zeroconf/cryptography imports.
+if TYPE_CHECKING:
+    from pyhap.accessory_driver import AccessoryDriver
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 logger = logging.getLogger("homekit-steam-user-switcher")
@@ -79,54 +81,84 @@ DEFAULT_FW = os.getenv("HOMEKIT_TV_FW", "1.0")
 LOGIN_USERS = Path(Path.home() / ".local/share/Steam/config/loginusers.vdf")
 REGISTRY = Path(Path.home() / ".steam/registry.vdf")
 
+# Delay before applying an input selection, so quick successive picks only write once
+INPUT_DEBOUNCE_SECONDS = 0.3
+
 # Built at runtime from Steam accounts; shape: List[(id, label, slug)]
 INPUTS: List[Tuple[int, str, str]] = []
 
 # --- Handler hooks: customize these to integrate with external scripts/services ---
-def on_power_changed(is_on: bool) -> None:
+async def on_power_changed(is_on: bool) -> None:
     """Called whenever the TV power state changes.
 
-    When turning off, restart Steam.
+    When turning off, restart Steam. The killall runs in the default executor
+    so the HAP event loop isn't blocked by the fork/exec.
     """
     logger.info("[handler] power=%s", "on" if is_on else "off")
     if not is_on:
         try:
             logger.info("Restarting Steam (killall steam)...")
-            subprocess.run(["killall", "steam"], check=False)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(subprocess.run, ["killall", "steam"], check=False))
         except Exception:
             logger.exception("Failed to restart Steam on power off")
 
 
-def on_input_changed(identifier: int, label: str, slug: str) -> None:
+def on_input_changed(identifier: int, label: str, slug: str) -> bool:
     """Called whenever the active input changes.
 
     Here, each input corresponds to a Steam account's AccountName. We set the
     AutoLoginUser in Steam's registry.vdf to that account (no immediate restart).
     Restart will happen when the TV is turned off from HomeKit.
+
+    Returns True if the change was applied, so a failed write can be retried.
     """
     logger.info("[handler] input=%s id=%s slug=%s", label, identifier, slug)
     try:
         set_account(slug)
         logger.info("Set Steam AutoLoginUser to %s", slug)
+        return True
     except Exception:
         logger.exception("Failed to set Steam AutoLoginUser to %s", slug)
+        return False
 # --- End handler hooks ---
 
 
-def _ensure_char(service, char_name: str):
-    """Ensure a characteristic exists on service; try to preload optional ones."""
-    try:
-        return service.get_characteristic(char_name)
-    except Exception:
-        try:
-            service.add_preload_characteristic(char_name)
-            return service.get_characteristic(char_name)
-        except Exception:
-            return None
+def _bulk_configure(service, values: Dict[str, object]) -> None:
+    """Set several characteristic values on service with a single pass over its characteristics."""
+    chars = {char.display_name: char for char in service.characteristics}
+    for char_name, value in values.items():
+        char = chars.get(char_name)
+        if char is None:
+            logger.debug("Service %s has no characteristic %s; skipping", service.display_name, char_name)
+            continue
+        # Initial configuration, so don't publish events (same as configure_char)
+        char.set_value(value, should_notify=False)
+
+
+# Anything that isn't a (Unicode) letter or digit
+_SLUG_RE = re.compile(r"[\W_]+")
 
 
 def _slugify_label(label: str) -> str:
-    return "".join(ch for ch in label.lower() if ch.isalnum())
+    return _SLUG_RE.sub("", label.lower())
+
+
+# Exact labels checked before substring rules, then (needle, InputSourceType) in priority order
+_INPUT_TYPE_EXACT = {"av": 4, "video": 4, "tuner": 2, "tv": 2, "antenna": 2}
+_INPUT_TYPE_RULES = (
+    ("hdmi", 3),
+    ("airplay", 8),
+    ("cast", 8),
+    ("app", 10),
+    ("usb", 9),
+    ("dvi", 7),
+    ("component", 6),
+    ("svideo", 5),
+    ("composite", 4),
+    ("home", 1),
+)
+_INPUT_TYPE_CACHE: Dict[str, int] = {}
 
 
 def _guess_input_type(name: str) -> int:
@@ -137,27 +169,14 @@ def _guess_input_type(name: str) -> int:
     6 ComponentVideo, 7 DVI, 8 AirPlay, 9 USB, 10 Application.
     """
     s = name.lower()
-    if "hdmi" in s:
-        return 3
-    if "airplay" in s or "cast" in s:
-        return 8
-    if s.startswith("app") or "app" in s:
-        return 10
-    if "usb" in s:
-        return 9
-    if "dvi" in s:
-        return 7
-    if "component" in s:
-        return 6
-    if "svideo" in s:
-        return 5
-    if "composite" in s or s in {"av", "video"}:
-        return 4
-    if s in {"tuner", "tv", "antenna"}:
-        return 2
-    if "home" in s:
-        return 1
-    return 0
+    v = _INPUT_TYPE_CACHE.get(s)
+    if v is not None:
+        return v
+    v = _INPUT_TYPE_EXACT.get(s)
+    if v is None:
+        v = next((code for needle, code in _INPUT_TYPE_RULES if needle in s), 0)
+    _INPUT_TYPE_CACHE[s] = v
+    return v
 
 
 def _default_serial() -> str:
@@ -168,176 +187,336 @@ def _default_serial() -> str:
 
 # --- Steam helpers (adapted from switch.py) ---
 def get_accounts():
+    import vdf
+
     with open(LOGIN_USERS, 'r') as f:
         user_registry = vdf.load(f)
     return user_registry['users']
 
 
+# A quoted VDF string (group 1) or a brace (group 2)
+_VDF_TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])')
+_VDF_ESCAPE_RE = re.compile(r'\\(.)')
+_VDF_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+def _vdf_unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return _VDF_ESCAPE_RE.sub(lambda m: _VDF_ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _scan_loginusers() -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """Extract (steamid, AccountName, PersonaName) per user from loginusers.vdf.
+
+    Walks the file's tokens tracking brace depth instead of building the full
+    tree; every other per-user field is skipped.
+    """
+    with open(LOGIN_USERS, 'r', encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    users: List[Tuple[str, Optional[str], Optional[str]]] = []
+    depth = 0
+    key: Optional[str] = None  # string token still waiting for its value or block
+    current: Optional[List[Optional[str]]] = None  # [steamid, AccountName, PersonaName]
+    for m in _VDF_TOKEN_RE.finditer(text):
+        brace = m.group(2)
+        if brace == "{":
+            depth += 1
+            if depth == 2 and key is not None:
+                current = [key, None, None]
+            key = None
+        elif brace == "}":
+            if depth == 2 and current is not None:
+                users.append((current[0], current[1], current[2]))
+                current = None
+            depth -= 1
+            key = None
+        elif key is None:
+            key = m.group(1)
+        else:
+            if depth == 2 and current is not None:
+                if key == "AccountName":
+                    current[1] = _vdf_unescape(m.group(1))
+                elif key == "PersonaName":
+                    current[2] = _vdf_unescape(m.group(1))
+            key = None
+    return users
+
+
+_AUTOLOGIN_RE = re.compile(rb'"AutoLoginUser"\s*"([^"]*)"')
+_SCAN_CHUNK = 64 * 1024
+_SCAN_CARRY = 512
+
+
+def _scan_autologin(path: Path) -> Optional[str]:
+    """Find AutoLoginUser in registry.vdf without building the full tree."""
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_SCAN_CHUNK)
+            if not chunk:
+                return None
+            buf = tail + chunk
+            m = _AUTOLOGIN_RE.search(buf)
+            if m:
+                return m.group(1).decode("utf-8")
+            # Keep the tail so a match split across chunks isn't lost
+            tail = buf[-_SCAN_CARRY:]
+
+
+class _RegistryStore:
+    """Parsed registry.vdf shared by reads and writes; reparsed only when the file changes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._data: Optional[dict] = None
+        self._mtime = 0.0
+
+    def _is_fresh(self) -> bool:
+        return self._data is not None and os.stat(self.path).st_mtime == self._mtime
+
+    def load(self) -> dict:
+        mtime = os.stat(self.path).st_mtime
+        if self._data is None or mtime != self._mtime:
+            import vdf
+
+            with open(self.path, 'r') as f:
+                self._data = vdf.load(f)
+            self._mtime = mtime
+        return self._data
+
+    def _steam_section(self) -> dict:
+        return self.load()['Registry']['HKCU']['Software']['Valve']['Steam']
+
+    def get_autologin(self) -> str:
+        if not self._is_fresh():
+            try:
+                account = _scan_autologin(self.path)
+                if account is not None:
+                    return account
+            except Exception:
+                logger.debug("Fast AutoLoginUser scan failed; parsing registry.vdf", exc_info=True)
+        return self._steam_section()['AutoLoginUser']
+
+    def set_autologin(self, account: str) -> None:
+        self._steam_section()['AutoLoginUser'] = account
+
+    def flush(self) -> None:
+        """Serialize the in-memory registry back to disk atomically."""
+        if self._data is None:
+            return
+        import vdf
+
+        # Write to a temp file and swap it in so Steam never sees a half-written registry
+        tmp = self.path.with_suffix('.vdf.tmp')
+        with open(tmp, 'w') as f:
+            vdf.dump(self._data, f, pretty=True)
+        os.replace(tmp, self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+
+_REGISTRY = _RegistryStore(REGISTRY)
+
+
 def get_account():
-    with open(REGISTRY, 'r') as f:
-        registry = vdf.load(f)
-    return registry['Registry']['HKCU']['Software']['Valve']['Steam']['AutoLoginUser']
+    return _REGISTRY.get_autologin()
 
 
 def set_account(account: str):
-    with open(REGISTRY, 'r') as f:
-        registry = vdf.load(f)
-    registry['Registry']['HKCU']['Software']['Valve']['Steam']['AutoLoginUser'] = account
-    with open(REGISTRY, 'w') as f:
-        vdf.dump(registry, f, pretty=True)
+    # Callers are already debounced (see TelevisionAccessory.set_active_identifier)
+    _REGISTRY.set_autologin(account)
+    _REGISTRY.flush()
 # --- end Steam helpers ---
 
 
-class TelevisionAccessory(Accessory):
-    category = CATEGORY_TELEVISION
-
-    # Accept the driver explicitly and pass it to the base Accessory
-    def __init__(self, driver: AccessoryDriver, name: str, input_items: List[Tuple[int, str, str]], initial_identifier: Optional[int] = None):
-        super().__init__(driver, name)
-        self.inputs = input_items  # list of (identifier, label, slug)
-        self.id_to_label = {i: label for i, label, _ in input_items}
-        self.id_to_slug = {i: slug for i, _, slug in input_items}
-        self.active_identifier = initial_identifier if initial_identifier is not None else (input_items[0][0] if input_items else 0)
-        self.is_active = 0
-        self._power_restore_handle = None  # asyncio TimerHandle for auto-restore
-
-        # Populate AccessoryInformation so Home suggests a better default name
-        serial = os.getenv("HOMEKIT_TV_SN", _default_serial())
-        try:
-            # Preferred API in HAP-python
-            self.set_info_service(
-                manufacturer=DEFAULT_MFR,
-                model=DEFAULT_MODEL,
-                serial_number=serial,
-                firmware_revision=DEFAULT_FW,
-            )
-            # Ensure AccessoryInformation.Name matches the accessory display name
-            info = self.get_service("AccessoryInformation")
-            if info:
-                _ensure_char(info, "Name") and info.configure_char("Name", value=name)
-        except Exception:
-            # Fallback: set characteristics directly
+@functools.lru_cache(maxsize=None)
+def _television_accessory_class():
+    """Define TelevisionAccessory on first use so pyhap is only imported when serving."""
+    from pyhap.accessory import Accessory
+    from pyhap.const import CATEGORY_TELEVISION
+
+    class TelevisionAccessory(Accessory):
+        category = CATEGORY_TELEVISION
+
+        # Accept the driver explicitly and pass it to the base Accessory
+        def __init__(self, driver: AccessoryDriver, name: str, input_items: List[Tuple[int, str, str]], initial_identifier: Optional[int] = None):
+            super().__init__(driver, name)
+            self.inputs = input_items  # list of (identifier, label, slug)
+            # Identifiers are small dense ints from 1, so index lookups by identifier (slot 0 is a sentinel)
+            max_id = max((i for i, _, _ in input_items), default=0)
+            labels = ["Unknown"] * (max_id + 1)
+            slugs = ["-"] * (max_id + 1)
+            for i, label, slug in input_items:
+                labels[i] = label
+                slugs[i] = slug
+            self._labels = tuple(labels)
+            self._slugs = tuple(slugs)
+            self.active_identifier = initial_identifier if initial_identifier is not None else (input_items[0][0] if input_items else 0)
+            # False until active_identifier is known to match Steam's AutoLoginUser
+            self._identifier_applied = initial_identifier is not None
+            self.is_active = 0
+            self._power_restore_handle = None  # asyncio TimerHandle for auto-restore
+            self._pending_write_handle = None  # asyncio TimerHandle for the debounced input handler
+            self._pending_input: Optional[Tuple[int, str, str]] = None
+
+            # Populate AccessoryInformation so Home suggests a better default name
+            serial = os.getenv("HOMEKIT_TV_SN", _default_serial())
             info = self.get_service("AccessoryInformation")
             if info:
-                _ensure_char(info, "Manufacturer") and info.configure_char("Manufacturer", value=DEFAULT_MFR)
-                _ensure_char(info, "Model") and info.configure_char("Model", value=DEFAULT_MODEL)
-                _ensure_char(info, "SerialNumber") and info.configure_char("SerialNumber", value=serial)
-                _ensure_char(info, "FirmwareRevision") and info.configure_char("FirmwareRevision", value=DEFAULT_FW)
-            # Also set the AccessoryInformation Name to match the display name
-            if info:
-                _ensure_char(info, "Name") and info.configure_char("Name", value=name)
-
-        # Create Television service
-        self.tv_service = self.add_preload_service(
-            "Television",
-            chars=["Active", "ActiveIdentifier", "ConfiguredName", "SleepDiscoveryMode", "Name"],
-        )
-        # Basic Television characteristics
-        self.tv_service.configure_char("Active", setter_callback=self.set_active)
-        self.tv_service.configure_char("ActiveIdentifier", setter_callback=self.set_active_identifier)
-        # Set both ConfiguredName and Name to ensure default presentation in Home
-        self.tv_service.configure_char("ConfiguredName", value=name)
-        self.tv_service.configure_char("Name", value=name)
-        self.tv_service.configure_char("SleepDiscoveryMode", value=1)  # Always discovered
-
-        # No RemoteKey handling needed
-
-        # Mark Television as primary so HomeKit treats it as the main service
-        try:
-            # Newer HAP-python
-            self.tv_service.is_primary_service = True
-        except Exception:
-            # Fallbacks for older versions
-            try:
-                self.tv_service.is_primary = True
-            except Exception:
-                pass
-
-        # Add input sources and link them
-        self.input_services = []
-        for identifier, label, slug in self.inputs:
-            # Preload all characteristics needed by InputSource to avoid "Characteristic not found"
-            input_service = self.add_preload_service(
-                "InputSource",
-                chars=[
-                    "Identifier",
-                    "ConfiguredName",
-                    "Name",
-                    "IsConfigured",
-                    "CurrentVisibilityState",
-                    "TargetVisibilityState",
-                    "InputSourceType",
-                ],
+                _bulk_configure(info, {
+                    "Manufacturer": DEFAULT_MFR,
+                    "Model": DEFAULT_MODEL,
+                    "SerialNumber": serial,
+                    "FirmwareRevision": DEFAULT_FW,
+                    # Match the AccessoryInformation Name to the display name
+                    "Name": name,
+                })
+
+            # Create Television service
+            self.tv_service = self.add_preload_service(
+                "Television",
+                chars=["Active", "ActiveIdentifier", "ConfiguredName", "SleepDiscoveryMode", "Name"],
             )
-            input_service.configure_char("Identifier", value=int(identifier))
-            input_service.configure_char("IsConfigured", value=1)  # Configured
-            input_service.configure_char("CurrentVisibilityState", value=0)  # Shown
-            # Set ConfiguredName first, then Name (some clients use one or the other)
-            input_service.configure_char("ConfiguredName", value=label)
-            input_service.configure_char("Name", value=label)
-            # TargetVisibilityState is optional; guard it
-            if _ensure_char(input_service, "TargetVisibilityState"):
-                input_service.configure_char("TargetVisibilityState", value=0)
-            input_service.configure_char("InputSourceType", value=_guess_input_type(label))
-
-            # Give each InputSource a stable subtype so HomeKit can persist names across restarts
-            try:
-                input_service.subtype = slug
-            except Exception:
-                pass
-
-            # Link input source to TV service per HAP spec
-            self.tv_service.add_linked_service(input_service)
-            self.input_services.append(input_service)
-        # Default values (set before advertising to HomeKit)
-        self.tv_service.get_characteristic("Active").set_value(self.is_active)
-        self.tv_service.get_characteristic("ActiveIdentifier").set_value(self.active_identifier)
-
-    def _restore_power(self) -> None:
-        """Flip power back on after a delay."""
-        self._power_restore_handle = None
-        self.is_active = 1
-        # Update characteristic so HomeKit reflects ON
-        try:
-            self.tv_service.get_characteristic("Active").set_value(1)
-        except Exception:
-            logger.exception("Failed to set Active=1 during auto-restore")
-        logger.info("Auto-restored power to On after delay")
-        on_power_changed(True)
-
-    # Callbacks
-    def set_active(self, value):
-        # Cancel any pending auto-restore when turning on
-        if value == 1 and self._power_restore_handle:
+            # Basic Television characteristics
+            self.tv_service.configure_char("Active", setter_callback=self.set_active)
+            self.tv_service.configure_char("ActiveIdentifier", setter_callback=self.set_active_identifier)
+            _bulk_configure(self.tv_service, {
+                # Set both ConfiguredName and Name to ensure default presentation in Home
+                "ConfiguredName": name,
+                "Name": name,
+                "SleepDiscoveryMode": 1,  # Always discovered
+                # Default values (set before advertising to HomeKit)
+                "Active": self.is_active,
+                "ActiveIdentifier": self.active_identifier,
+            })
+
+            # No RemoteKey handling needed
+
+            # Mark Television as primary so HomeKit treats it as the main service
             try:
-                self._power_restore_handle.cancel()
+                # Newer HAP-python
+                self.tv_service.is_primary_service = True
             except Exception:
-                pass
+                # Fallbacks for older versions
+                try:
+                    self.tv_service.is_primary = True
+                except Exception:
+                    pass
+
+            # Add input sources and link them
+            self.input_services = []
+            for identifier, label, slug in self.inputs:
+                # Preload all characteristics needed by InputSource to avoid "Characteristic not found"
+                input_service = self.add_preload_service(
+                    "InputSource",
+                    chars=[
+                        "Identifier",
+                        "ConfiguredName",
+                        "Name",
+                        "IsConfigured",
+                        "CurrentVisibilityState",
+                        "TargetVisibilityState",
+                        "InputSourceType",
+                    ],
+                )
+                _bulk_configure(input_service, {
+                    "Identifier": int(identifier),
+                    "IsConfigured": 1,  # Configured
+                    "CurrentVisibilityState": 0,  # Shown
+                    # Set ConfiguredName first, then Name (some clients use one or the other)
+                    "ConfiguredName": label,
+                    "Name": label,
+                    # TargetVisibilityState is optional; skipped if the service lacks it
+                    "TargetVisibilityState": 0,
+                    "InputSourceType": _guess_input_type(label),
+                })
+
+                # Give each InputSource a stable subtype so HomeKit can persist names across restarts
+                try:
+                    input_service.subtype = slug
+                except Exception:
+                    pass
+
+                # Link input source to TV service per HAP spec
+                self.tv_service.add_linked_service(input_service)
+                self.input_services.append(input_service)
+
+        def _restore_power(self) -> None:
+            """Flip power back on after a delay."""
             self._power_restore_handle = None
-        self.is_active = value
-        logger.info("Power %s", "On" if value == 1 else "Off")
-        on_power_changed(value == 1)
-        # If turned off, schedule auto-restore in 2 seconds
-        if value == 0:
+            self.is_active = 1
+            # Update characteristic so HomeKit reflects ON
             try:
-                if self._power_restore_handle:
+                self.tv_service.get_characteristic("Active").set_value(1)
+            except Exception:
+                logger.exception("Failed to set Active=1 during auto-restore")
+            logger.info("Auto-restored power to On after delay")
+            self.driver.async_add_job(on_power_changed, True)
+
+        # Callbacks
+        def set_active(self, value):
+            # HomeKit re-asserts state on reconnect; don't restart Steam for a no-op
+            if int(value) == self.is_active:
+                return
+            # Cancel any pending auto-restore when turning on
+            if value == 1 and self._power_restore_handle:
+                try:
                     self._power_restore_handle.cancel()
-                self._power_restore_handle = self.driver.loop.call_later(2.0, self._restore_power)
-                logger.debug("Scheduled auto-restore in 2s")
+                except Exception:
+                    pass
+                self._power_restore_handle = None
+            # Apply any pending input change before Steam is restarted
+            if value == 0 and self._pending_write_handle:
+                self._pending_write_handle.cancel()
+                self._commit_input()
+            self.is_active = value
+            logger.info("Power %s", "On" if value == 1 else "Off")
+            # Setter callbacks run on the HAP loop; schedule the handler instead of awaiting it here
+            self.driver.async_add_job(on_power_changed, value == 1)
+            # If turned off, schedule auto-restore in 2 seconds
+            if value == 0:
+                try:
+                    if self._power_restore_handle:
+                        self._power_restore_handle.cancel()
+                    self._power_restore_handle = self.driver.loop.call_later(2.0, self._restore_power)
+                    logger.debug("Scheduled auto-restore in 2s")
+                except Exception:
+                    logger.exception("Failed to schedule auto-restore")
+
+        def set_active_identifier(self, value):
+            # Skip re-selecting the current input, unless it hasn't been applied yet
+            if value == self.active_identifier and self._identifier_applied:
+                return
+            self.active_identifier = value
+            self._identifier_applied = False  # set once the debounced handler succeeds
+            if 0 <= value < len(self._labels):
+                label = self._labels[value]
+                slug = self._slugs[value]
+            else:
+                label, slug = "Unknown", "-"
+            logger.info("Input selected: %s (%s, slug=%s)", value, label, slug)
+            # Coalesce rapid selections (e.g. scrolling the picker) into one handler call
+            self._pending_input = (value, label, slug)
+            if self._pending_write_handle:
+                self._pending_write_handle.cancel()
+            try:
+                self._pending_write_handle = self.driver.loop.call_later(INPUT_DEBOUNCE_SECONDS, self._commit_input)
             except Exception:
-                logger.exception("Failed to schedule auto-restore")
+                logger.exception("Failed to schedule input change; applying immediately")
+                self._commit_input()
 
-    def set_active_identifier(self, value):
-        self.active_identifier = value
-        label = self.id_to_label.get(value, "Unknown")
-        slug = self.id_to_slug.get(value, "-")
-        logger.info("Input selected: %s (%s, slug=%s)", value, label, slug)
-        # Invoke handler
-        on_input_changed(value, label, slug)
+        def _commit_input(self) -> None:
+            """Invoke the input handler for the last selection once it has settled."""
+            self._pending_write_handle = None
+            pending, self._pending_input = self._pending_input, None
+            if pending:
+                self._identifier_applied = bool(on_input_changed(*pending))
 
-    # Remote key handling removed
+        # Remote key handling removed
 
-    # Speaker-related methods removed: no TelevisionSpeaker service
+        # Speaker-related methods removed: no TelevisionSpeaker service
+
+    return TelevisionAccessory
 
 
 def _detect_lan_ip(fallback: str = "127.0.0.1") -> str:
@@ -350,7 +529,51 @@ def _detect_lan_ip(fallback: str = "127.0.0.1") -> str:
         return fallback
 
 
+def _is_local_address(ip: str) -> bool:
+    """Return True if ip is still assigned to this host (i.e. we can bind to it)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.bind((ip, 0))
+        return True
+    except OSError:
+        return False
+
+
+def _detect_lan_ip_fast(persist_dir: Path, fallback: str = "127.0.0.1") -> str:
+    """Detect primary LAN IPv4, remembering the last good address in persist_dir.
+
+    The route-based _detect_lan_ip sends no packets and needs no DNS, so it is
+    tried first. If no route is up yet (e.g. early in boot), the cached address
+    is reused as long as the host still owns it; a stale cache is discarded.
+    """
+    cache_file = persist_dir / "lan_ip"
+    ip = _detect_lan_ip(fallback)
+    if ip != fallback:
+        try:
+            persist_dir.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(ip + "\n")
+        except OSError:
+            logger.debug("Could not cache LAN IP in %s", cache_file, exc_info=True)
+        return ip
+
+    try:
+        cached = cache_file.read_text().strip()
+    except OSError:
+        return ip
+    if cached and _is_local_address(cached):
+        logger.info("No default route; reusing last known LAN IP %s", cached)
+        return cached
+    logger.debug("Discarding stale cached LAN IP %r", cached)
+    try:
+        cache_file.unlink()
+    except OSError:
+        pass
+    return ip
+
+
 def run(name: str, port: int, input_items: List[Tuple[int, str, str]], persist_dir: Path, address: str = "0.0.0.0", debug: bool = False, initial_identifier: Optional[int] = None):
+    from pyhap.accessory_driver import AccessoryDriver
+
     persist_dir.mkdir(parents=True, exist_ok=True)
     if debug:
         logging.getLogger("pyhap").setLevel(logging.DEBUG)
@@ -366,6 +589,7 @@ def run(name: str, port: int, input_items: List[Tuple[int, str, str]], persist_d
     )
 
     # Pass the driver into the accessory
+    TelevisionAccessory = _television_accessory_class()
     tv = TelevisionAccessory(driver, name=name, input_items=input_items, initial_identifier=initial_identifier)
     driver.add_accessory(tv)
 
@@ -416,12 +640,18 @@ if __name__ == "__main__":
     else:
         # Build inputs from Steam login users
         try:
-            accounts = get_accounts()
-            # Each entry is a dict with AccountName and PersonaName
+            try:
+                accounts = _scan_loginusers()
+            except Exception:
+                logger.debug("Scanning loginusers.vdf failed; parsing it in full", exc_info=True)
+                accounts = []
+            if not accounts:
+                accounts = [
+                    (steamid, account.get('AccountName'), account.get('PersonaName'))
+                    for steamid, account in get_accounts().items()
+                ]
             items: List[Tuple[int, str, str]] = []
-            for idx, account in enumerate(accounts.values(), start=1):
-                acc_name = account.get('AccountName')
-                persona = account.get('PersonaName')
+            for idx, (_, acc_name, persona) in enumerate(accounts, start=1):
                 if not acc_name:
                     # Skip invalid entries
                     continue
@@ -433,11 +663,8 @@ if __name__ == "__main__":
 
             # Try to match current AutoLoginUser to set initial active input
             try:
-                current = get_account()
-                for i, _, slug in items:
-                    if slug == current:
-                        initial_identifier = i
-                        break
+                slug_to_id = {slug: i for i, _, slug in items}
+                initial_identifier = slug_to_id.get(get_account())
             except Exception:
                 pass
 
@@ -453,7 +680,7 @@ if __name__ == "__main__":
     # Resolve bind/advertised address
     bind_addr = cli.bind
     if bind_addr in ("auto", "", "0.0.0.0"):
-        bind_addr = _detect_lan_ip()
+        bind_addr = _detect_lan_ip_fast(Path(cli.persist))
     if bind_addr.startswith("127."):
         logger.warning("Resolved bind address is loopback (%s); HomeKit will not reach it from your phone.", bind_addr)
     logger.info("Binding and advertising on %s:%s", bind_addr, cli.port)